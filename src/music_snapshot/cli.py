@@ -1,38 +1,47 @@
 """Click based command line interface."""
 
+import contextlib
 import dataclasses
+import functools
 import os
 import sys
+from collections.abc import Iterator
 from datetime import date, datetime, time, timedelta, timezone
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 import click
-import pylast
-import questionary
 import rich_click
-import spotipy
 from click import ClickException
 from rich.console import Console
-from rich.markdown import Markdown
-from rich.progress import track as rich_progress_bar
-from spotipy import SpotifyException
 
 from music_snapshot.config import MusicSnapshotConfig
-from music_snapshot.tracks import guess_end_track, lastfm_track_to_spotify, select_track
 from music_snapshot.utils import (
-    DATETIME_FORMAT,
-    TIME_FORMAT,
     DefaultRichGroup,
     chunks,
     validate_date,
     validate_time,
 )
 
+# API clients (and `questionary`) take a while to import, so they're only imported
+# in subcommands that actually use them, to keep `--help` and `--version` snappy
+if TYPE_CHECKING:
+    import pylast
+    import requests
+    import spotipy
+
+    from music_snapshot.track_cache import TrackCache
+
 UTC = timezone.utc  # Python 3.11
 
 # TODO: Make these configurable?
 MUSIC_SNAPSHOT_CONFIG_PATH = Path.home() / ".music_snapshot"
 SPOTIPY_CACHE_PATH = Path.home() / ".spotipy"
+TRACK_CACHE_PATH = (
+    Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache")
+    / "music_snapshot"
+    / "spotify_search.sqlite"
+)
 SPOTIPY_SCOPES = [
     "playlist-modify-public",
     "playlist-modify-private",
@@ -50,15 +59,116 @@ rich_console = Console()
 class MusicSnapshotContext:
     """App context schema.
 
+    API clients are created lazily, only when they're actually used.
+
     Attributes:
         config: Instance of `MusicSnapshotConfig`.
-        spotify_api: Instance of `spotipy` Spotify API client.
-        lastfm_api: Instance of `pylast` Last.fm API client.
     """
 
     config: MusicSnapshotConfig
-    spotify_api: spotipy.Spotify
-    lastfm_api: pylast.LastFMNetwork
+
+    @functools.cached_property
+    def requests_session(self) -> "requests.Session":
+        """Shared `requests` session for API clients.
+
+        Its connection pool is big enough for concurrent requests (i.e. Spotify song
+        searches), so connections are reused instead of being reopened every time.
+        """
+        import requests
+        from urllib3.util import Retry
+
+        # Same retry logic as `spotipy` uses by default, which also respects
+        # the `Retry-After` header when we hit the API rate limit
+        retry = Retry(
+            total=3,
+            connect=None,
+            read=False,
+            allowed_methods=frozenset(["GET", "POST", "PUT", "DELETE"]),
+            status=3,
+            backoff_factor=0.3,
+            status_forcelist=(429, 500, 502, 503, 504),
+        )
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=32,
+            pool_maxsize=32,
+            max_retries=retry,
+        )
+
+        session = requests.Session()
+        session.mount("https://", adapter)
+
+        return session
+
+    @functools.cached_property
+    def spotify_api(self) -> "spotipy.Spotify":
+        """Instance of `spotipy` Spotify API client."""
+        import spotipy
+
+        try:
+            return spotipy.Spotify(
+                auth_manager=spotipy.SpotifyOAuth(
+                    client_id=self.config.spotify_client_id,
+                    client_secret=self.config.spotify_client_secret,
+                    redirect_uri=self.config.spotify_redirect_uri,
+                    scope=SPOTIPY_SCOPES,
+                    cache_handler=spotipy.CacheFileHandler(
+                        cache_path=SPOTIPY_CACHE_PATH,
+                    ),
+                    requests_session=self.requests_session,
+                ),
+                requests_session=self.requests_session,
+            )
+        except spotipy.SpotifyException as e:
+            raise click.UsageError(str(e)) from e
+
+    @functools.cached_property
+    def lastfm_api(self) -> "pylast.LastFMNetwork":
+        """Instance of `pylast` Last.fm API client."""
+        import pylast
+
+        try:
+            return pylast.LastFMNetwork(
+                api_key=self.config.lastfm_api_key,
+                api_secret=self.config.lastfm_api_secret,
+            )
+        except pylast.PyLastError as e:
+            raise click.UsageError(str(e)) from e
+
+
+@contextlib.contextmanager
+def open_track_cache(path: Path) -> Iterator["TrackCache | None"]:
+    """Open Spotify search cache, if possible.
+
+    The cache is only an optimization, so any issues with it (e.g. a corrupted or
+    not writable cache file) are reported, but otherwise ignored.
+
+    Arguments:
+        path: Cache file path.
+
+    Yields:
+        Opened Spotify search cache, or `None` if it couldn't be opened.
+    """
+    import sqlite3
+
+    from music_snapshot.track_cache import TrackCache
+
+    track_cache: TrackCache | None
+    try:
+        track_cache = TrackCache(path)
+    except (sqlite3.Error, OSError) as e:
+        message = f"Couldn't open Spotify search cache ({e}), continuing without it."
+        rich_console.print(f"> {message}", style="yellow")
+        track_cache = None
+
+    try:
+        yield track_cache
+    finally:
+        if track_cache is not None:
+            try:
+                track_cache.close()
+            except (sqlite3.Error, OSError) as e:
+                message = f"Couldn't save Spotify search cache ({e})."
+                rich_console.print(f"> {message}", style="yellow")
 
 
 @click.group(cls=DefaultRichGroup, default="create", default_if_no_args=True)
@@ -95,34 +205,7 @@ def cli(ctx: click.Context) -> None:
                 "Config file not found. You need to run `authorize` subcommand first."
             ) from None
 
-        try:
-            spotify_api = spotipy.Spotify(
-                auth_manager=spotipy.SpotifyOAuth(
-                    client_id=config.spotify_client_id,
-                    client_secret=config.spotify_client_secret,
-                    redirect_uri=config.spotify_redirect_uri,
-                    scope=SPOTIPY_SCOPES,
-                    cache_handler=spotipy.CacheFileHandler(
-                        cache_path=SPOTIPY_CACHE_PATH,
-                    ),
-                )
-            )
-        except spotipy.SpotifyException as e:
-            raise click.UsageError(str(e)) from e
-
-        try:
-            lastfm_api = pylast.LastFMNetwork(
-                api_key=config.lastfm_api_key,
-                api_secret=config.lastfm_api_secret,
-            )
-        except pylast.PyLastError as e:
-            raise click.UsageError(str(e)) from e
-
-        ctx.obj = MusicSnapshotContext(
-            config=config,
-            spotify_api=spotify_api,
-            lastfm_api=lastfm_api,
-        )
+        ctx.obj = MusicSnapshotContext(config=config)
 
 
 @cli.command()
@@ -193,6 +276,10 @@ def authorize(
     "Redirect URI" set to `http://localhost:6600/music_snapshot`). To get Last.fm
     API keys, create a [new API account](https://www.last.fm/api/account/create).
     """
+    import pylast
+    import spotipy
+    from rich.markdown import Markdown
+
     # Spotify
     spotify_client = spotipy.Spotify(
         auth_manager=spotipy.SpotifyOAuth(
@@ -251,6 +338,19 @@ def create(obj: MusicSnapshotContext) -> None:
     A 'music snapshot' is a Spotify playlist that encapsulates a part of your music
     playing history.
     """
+    import questionary
+    from rich.progress import track as rich_progress_bar
+    from spotipy import SpotifyException
+
+    from music_snapshot.tracks import (
+        EnumeratedTrack,
+        TrackIndex,
+        get_played_tracks,
+        guess_end_track,
+        lastfm_tracks_to_spotify,
+        select_track,
+    )
+
     now = datetime.now(UTC)
     today = now.date()
     page_size = 10
@@ -289,6 +389,7 @@ def create(obj: MusicSnapshotContext) -> None:
     # Combine start date and start time
     start_datetime = datetime.combine(start_date, start_time)
     start_datetime = start_datetime.astimezone()  # Local timezone
+    start_timestamp = int(start_datetime.timestamp())
     start_datetime -= timedelta(minutes=60)  # Small buffer
 
     if start_datetime >= now:
@@ -300,29 +401,39 @@ def create(obj: MusicSnapshotContext) -> None:
     time_to = int((start_datetime + timedelta(days=2)).timestamp())
 
     lastfm_user = obj.lastfm_api.get_user(obj.config.lastfm_username)
-    track_candidates = lastfm_user.get_recent_tracks(
-        limit=500,
+    played_tracks = get_played_tracks(
+        lastfm_user,
         time_from=time_from,
         time_to=time_to,
     )
-    # Even though we use the `from` filtering, the track list is still 'newest first'
-    track_candidates.reverse()
+
+    track_candidates = TrackIndex.from_played_tracks(played_tracks)
 
     if len(track_candidates) == 0:
         raise click.ClickException("No song candidates found.")
 
-    # Select first track
+    # Select first track (while trying to default to the first one played after
+    # passed start time, as the candidates include a small buffer before it)
+    start_track_n = min(
+        track_candidates.find_played_at(start_timestamp),
+        len(track_candidates) - 1,
+    )
+    start_track = EnumeratedTrack(
+        n=start_track_n, track=track_candidates[start_track_n]
+    )
     selected_first_track = select_track(
         tracks=track_candidates,
+        page=int(start_track_n / page_size),
         page_size=page_size,
+        default_choice=start_track,
         select_message="Select first song:",
     )
     if not selected_first_track:
         raise click.ClickException("You need to select the first song.")
 
     first_track_n, first_track = (
-        selected_first_track["n"],
-        selected_first_track["played_track"],
+        selected_first_track.n,
+        selected_first_track.track,
     )
 
     # Try to guess the end track
@@ -332,34 +443,34 @@ def create(obj: MusicSnapshotContext) -> None:
     )
 
     # Select last track (while trying to default to the guessed value)
-    page = int(guessed_track["n"] / page_size) if guessed_track else 0
-    default_choice = guessed_track if guessed_track else None
+    page = int(guessed_track.n / page_size) if guessed_track else 0
     selected_last_track = select_track(
         tracks=track_candidates,
         page=page,
         page_size=page_size,
-        default_choice=dict(default_choice) if default_choice else None,  # For mypy
+        default_choice=guessed_track,
         select_message="Select last song:",
     )
     if not selected_last_track:
         raise click.ClickException("You need to select the last song.")
 
     last_track_n, last_track = (
-        selected_last_track["n"],
-        selected_last_track["played_track"],
+        selected_last_track.n,
+        selected_last_track.track,
     )
 
     # Some validation
-    first_track_played_at = datetime.fromtimestamp(int(first_track.timestamp), UTC)
-    first_track_played_at = first_track_played_at.astimezone()  # Local timezone
-    last_track_played_at = datetime.fromtimestamp(int(last_track.timestamp), UTC)
-    last_track_played_at = last_track_played_at.astimezone()  # Local timezone
-
-    if first_track_played_at >= last_track_played_at:
+    if first_track.ts >= last_track.ts:
         raise click.ClickException("First song needs to be before the last song.")
 
+    # Already formatted (in local timezone) when building the track index
+    first_track_date = track_candidates.dates[first_track_n]
+    first_track_time = track_candidates.times[first_track_n]
+    last_track_date = track_candidates.dates[last_track_n]
+    last_track_time = track_candidates.times[last_track_n]
+
     # Playlist name
-    default_name = first_track_played_at.date().isoformat()
+    default_name = first_track_date
 
     message = "Playlist name:"
     snapshot_name = questionary.text(message, default=default_name).ask()
@@ -382,14 +493,16 @@ def create(obj: MusicSnapshotContext) -> None:
     spotify_user = obj.spotify_api.me()
     spotify_user_id = spotify_user["id"]
 
-    tracks_to_add = track_candidates[first_track_n : last_track_n + 1]
+    tracks_to_add = [
+        track_candidates[n] for n in range(first_track_n, last_track_n + 1)
+    ]
 
     # For some reason, line breaks aren't supported in the playlist description
-    description = f"🎵 📸 | {first_track_played_at.strftime(DATETIME_FORMAT)} - "
-    if first_track_played_at.date() == last_track_played_at.date():
-        description += f"{last_track_played_at.strftime(TIME_FORMAT)}"
+    description = f"🎵 📸 | {first_track_date} {first_track_time} - "
+    if first_track_date == last_track_date:
+        description += last_track_time
     else:
-        description += f"{last_track_played_at.strftime(DATETIME_FORMAT)}"
+        description += f"{last_track_date} {last_track_time}"
 
     # Unfortunately, Spotify API doesn't allow creating truly private playlists
     # through the API. See:
@@ -397,47 +510,62 @@ def create(obj: MusicSnapshotContext) -> None:
     # - https://community.spotify.com/t5/Spotify-for-Developers/Api-to-create-a-private-playlist-doesn-t-work/m-p/5407807#M5076
     public = False
 
-    try:
-        playlist = obj.spotify_api.user_playlist_create(
-            user=spotify_user_id,
-            name=snapshot_name,
-            description=description,
-            public=public,
+    # Spotify search cache is opened before creating the playlist, so any issues
+    # with it are reported (and ignored) before anything is created
+    with open_track_cache(TRACK_CACHE_PATH) as track_cache:
+        try:
+            playlist = obj.spotify_api.user_playlist_create(
+                user=spotify_user_id,
+                name=snapshot_name,
+                description=description,
+                public=public,
+            )
+        except SpotifyException as e:
+            raise ClickException(f"Error when creating the playlist:\n{e}") from e
+
+        rich_console.print(
+            f"> Successfully created '{snapshot_name}'.",
+            style="green",
         )
-    except SpotifyException as e:
-        raise ClickException(f"Error when creating the playlist:\n{e}") from e
 
-    rich_console.print(
-        f"> Successfully created '{snapshot_name}'.",
-        style="green",
-    )
+        # Add tracks to playlist
+        spotify_api = obj.spotify_api
 
-    # Add tracks to playlist
-    spotify_songs_to_add = []
-    for played_track in rich_progress_bar(
-        tracks_to_add,
-        description="> Working...",
-        console=rich_console,
-    ):
-        try:
-            spotify_song = lastfm_track_to_spotify(
-                spotify_api=obj.spotify_api,
-                track=played_track.track,
-            )
-        except ValueError as e:
-            rich_console.print(f"> {e}", style="red")
-        else:
-            spotify_songs_to_add.append(spotify_song["id"])
-
-    songs_chunks = chunks(spotify_songs_to_add, n=75)
-    for song_chunk in songs_chunks:
-        obj.spotify_api.playlist_add_items(
-            playlist_id=playlist["id"],
-            items=song_chunk,
+        songs_added = 0
+
+        spotify_song_ids = lastfm_tracks_to_spotify(
+            spotify_api,
+            tracks_to_add,
+            track_cache=track_cache,
         )
 
+        def found_spotify_song_ids() -> Iterator[str]:
+            """Yield found Spotify song IDs, while reporting progress."""
+            for track, spotify_song_id in rich_progress_bar(
+                zip(tracks_to_add, spotify_song_ids, strict=True),
+                total=len(tracks_to_add),
+                description="> Working...",
+                console=rich_console,
+            ):
+                if not spotify_song_id:
+                    message = f"Couldn't find '{track.title} by {track.artist}'"
+                    rich_console.print(f"> {message} in Spotify.", style="red")
+                    continue
+
+                yield spotify_song_id
+
+        # Songs need to be added in order, but there's no need to wait until all
+        # of them are found; each full chunk (Spotify API accepts up to 100 items
+        # at once) is added while the remaining songs are still being searched for
+        for song_chunk in chunks(found_spotify_song_ids(), n=100):
+            spotify_api.playlist_add_items(
+                playlist_id=playlist["id"],
+                items=song_chunk,
+            )
+            songs_added += len(song_chunk)
+
     rich_console.print(
-        f"> Successfully added {len(spotify_songs_to_add)} songs to '{snapshot_name}'.",
+        f"> Successfully added {songs_added} songs to '{snapshot_name}'.",
         style="bold green",
     )
 
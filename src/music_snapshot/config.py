@@ -4,7 +4,7 @@ import dataclasses
 import json
 import os
 import sys
-from functools import partial
+from functools import lru_cache
 from pathlib import Path
 
 if sys.version_info < (3, 11):
@@ -12,6 +12,11 @@ if sys.version_info < (3, 11):
 else:
     from typing import Self
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore[assignment]
+
 
 @dataclasses.dataclass
 class MusicSnapshotConfig:
@@ -46,8 +51,8 @@ class MusicSnapshotConfig:
         Returns:
             Loaded music_snapshot config.
         """
-        with open(config_path) as f:
-            config = json.load(f)
+        config_path = os.fspath(config_path)
+        config = _read_config(config_path, os.stat(config_path).st_mtime_ns)
 
         return cls(**config)
 
@@ -60,5 +65,55 @@ class MusicSnapshotConfig:
         # Make sure the file is not publicly accessible
         # Source: https://github.com/python/cpython/issues/73400
         os.umask(0o077)
-        with open(config_path, "w", opener=partial(os.open, mode=0o600)) as f:
-            f.write(json.dumps(dataclasses.asdict(self), indent=2))
+
+        if orjson is None:
+            # All fields are flat, so there's no need for `dataclasses.asdict` deep
+            # copying
+            config = {name: self.__dict__[name] for name in _FIELD_NAMES}
+            data = json.dumps(config, indent=2).encode()
+        else:
+            # `orjson` serializes dataclasses natively
+            data = orjson.dumps(self, option=orjson.OPT_INDENT_2)
+
+        with open(config_path, "wb", opener=_secure_opener) as f:
+            f.write(data)
+
+
+_FIELD_NAMES = tuple(field.name for field in dataclasses.fields(MusicSnapshotConfig))
+
+
+def _secure_opener(path: str, flags: int) -> int:
+    """Open a file that's only accessible by its owner (to be used as `opener`).
+
+    Arguments:
+        path: File path.
+        flags: File open flags.
+
+    Returns:
+        Opened file descriptor.
+    """
+    return os.open(path, flags, 0o600)
+
+
+@lru_cache(maxsize=1)
+def _read_config(config_path: str, mtime_ns: int) -> dict:
+    """Read config file from disk.
+
+    It's cached on passed file path and its modification time, so the file is only
+    read again when it changes.
+
+    Arguments:
+        config_path: Config file path.
+        mtime_ns: Config file modification time (in nanoseconds).
+
+    Returns:
+        Config file content.
+    """
+    # Both JSON parsers accept bytes, so there's no need for text mode decoding
+    with open(config_path, "rb") as f:
+        data = f.read()
+
+    if orjson is None:
+        return json.loads(data)
+
+    return orjson.loads(data)
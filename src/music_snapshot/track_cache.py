@@ -0,0 +1,144 @@
+"""Persistent cache of Last.fm track to Spotify song matches.
+
+Matching a Last.fm track to a Spotify song requires a (slow) Spotify API search
+request, while the result basically never changes, so it's worth caching it on disk
+between `music_snapshot` runs.
+"""
+
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+if sys.version_info < (3, 11):
+    from typing_extensions import Self
+else:
+    from typing import Self
+
+
+class TrackCache:
+    """SQLite backed cache of Last.fm track to Spotify song ID matches.
+
+    Tracks that couldn't be found in Spotify are cached as well (with `None` as their
+    Spotify song ID), but only for `not_found_ttl` seconds, so we don't search for
+    them on every run, but still retry every now and then.
+
+    New entries are kept in memory and saved to disk in bulk on `flush` (or `close`).
+    The cache can be safely used from multiple threads.
+
+    Attributes:
+        path: SQLite database file path.
+        not_found_ttl: For how long (in seconds) to cache tracks that couldn't be
+            found in Spotify.
+    """
+
+    def __init__(self, path: Path | str, *, not_found_ttl: int = 24 * 60 * 60) -> None:
+        """Open (and initialize, if needed) the cache database.
+
+        Arguments:
+            path: SQLite database file path.
+            not_found_ttl: For how long (in seconds) to cache tracks that couldn't
+                be found in Spotify.
+        """
+        self.path = path
+        self.not_found_ttl = not_found_ttl
+
+        self._lock = threading.Lock()
+        self._pending: dict[str, tuple[str | None, int]] = {}
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        try:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS resolutions "
+                "(key TEXT PRIMARY KEY, spotify_id TEXT, ts INTEGER)"
+            )
+            self._connection.commit()
+        except sqlite3.Error:
+            # E.g. when the file exists, but it's not an SQLite database
+            self._connection.close()
+            raise
+
+    def __enter__(self) -> Self:
+        """Return the cache instance itself."""
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        """Save pending entries to disk and close the database connection."""
+        self.close()
+
+    @staticmethod
+    def make_key(artist_name: str, track_name: str) -> str:
+        """Create a cache key for passed track.
+
+        Arguments:
+            artist_name: (Cleaned) artist name.
+            track_name: (Cleaned) track name.
+
+        Returns:
+            Cache key for passed track.
+        """
+        return f"{artist_name}\x00{track_name}".lower()
+
+    def get(self, key: str) -> str | None:
+        """Get cached Spotify song ID.
+
+        Arguments:
+            key: Cache key (see `make_key`).
+
+        Raises:
+            KeyError: When there's no (valid) cache entry for passed key.
+
+        Returns:
+            Cached Spotify song ID, or `None` if the track couldn't be found
+            in Spotify.
+        """
+        with self._lock:
+            if key in self._pending:
+                spotify_id, ts = self._pending[key]
+            else:
+                row = self._connection.execute(
+                    "SELECT spotify_id, ts FROM resolutions WHERE key = ?",
+                    (key,),
+                ).fetchone()
+                if row is None:
+                    raise KeyError(key)
+
+                spotify_id, ts = row
+
+        if spotify_id is None and ts + self.not_found_ttl < time.time():
+            raise KeyError(key)
+
+        return spotify_id
+
+    def set(self, key: str, spotify_id: str | None) -> None:
+        """Cache Spotify song ID.
+
+        Arguments:
+            key: Cache key (see `make_key`).
+            spotify_id: Spotify song ID, or `None` if the track couldn't be found
+                in Spotify.
+        """
+        with self._lock:
+            self._pending[key] = (spotify_id, int(time.time()))
+
+    def flush(self) -> None:
+        """Save pending cache entries to disk."""
+        with self._lock:
+            if not self._pending:
+                return
+
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO resolutions (key, spotify_id, ts) "
+                "VALUES (?, ?, ?)",
+                [(key, *value) for key, value in self._pending.items()],
+            )
+            self._connection.commit()
+            self._pending.clear()
+
+    def close(self) -> None:
+        """Save pending cache entries to disk and close the database connection."""
+        self.flush()
+        self._connection.close()
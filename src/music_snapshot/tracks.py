@@ -4,16 +4,23 @@ I prefer 'song' terminology, but decided to follow `pylast` naming conventions i
 Last.fm context, and 'song' in Spotify context.
 """
 
-from datetime import datetime, timedelta, timezone
-from typing import Any, TypedDict
+import bisect
+import dataclasses
+import math
+import operator
+import re
+import threading
+import time
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import NamedTuple
 
 import pylast
 import questionary
 import spotipy
 
-from music_snapshot.utils import DATE_FORMAT, TIME_FORMAT
-
-UTC = timezone.utc  # Python 3.11
+from music_snapshot.track_cache import TrackCache
+from music_snapshot.utils import DATETIME_FORMAT
 
 MUSIC_SNAPSHOT_QUESTIONARY_STYLE = questionary.Style(
     [
@@ -26,55 +33,309 @@ MUSIC_SNAPSHOT_QUESTIONARY_STYLE = questionary.Style(
 )
 """Default `music_snapshot` questionary style."""
 
+# Last.fm and Spotify naming conventions sometimes differ, so it's safer
+# to remove some of the extra words and 'suffixes'
+_ARTIST_NAME_THE_RE = re.compile(r"\bthe\b\s*", re.IGNORECASE)
+_TRACK_NAME_FEATURING_RE = re.compile(r"\s*(?:\s|[(\[])(?:feat|ft)\b.*$", re.IGNORECASE)
+
+# Maximum number of recently shown track selection pages to keep
+_PAGES_CACHE_SIZE = 8
+
+_get_search_tracks = operator.itemgetter("tracks")
+_get_search_items = operator.itemgetter("items")
+
+
+class TrackRow(NamedTuple):
+    """Plain details of a single 'played track'.
+
+    Attributes:
+        artist: Artist name.
+        title: Track name.
+        album: Album name.
+        ts: When the track was played (as a Unix timestamp).
+        raw: Original `pylast` 'played track' instance.
+    """
+
+    artist: str
+    title: str
+    album: str
+    ts: int
+    raw: pylast.PlayedTrack
+
+
+@dataclasses.dataclass
+class TrackIndex:
+    """Plain details of a list of 'played tracks', stored as parallel lists.
 
-class EnumeratedTrack(TypedDict):
-    """Simple dict schema for an enumerated track.
+    Getting them out of `pylast` objects goes through a chain of method calls, so
+    it's better to do it only once. Keeping each detail in its own list also makes
+    scanning them (e.g. timestamps) cheaper.
+
+    Attributes:
+        timestamps: When the tracks were played (as Unix timestamps).
+        dates: When the tracks were played (as formatted local dates).
+        times: When the tracks were played (as formatted local times).
+        track_names: Track names.
+        artists: Artist names.
+        albums: Album names.
+        played_tracks: Original `pylast` 'played track' instances.
+    """
+
+    timestamps: list[int]
+    dates: list[str]
+    times: list[str]
+    track_names: list[str]
+    artists: list[str]
+    albums: list[str]
+    played_tracks: list[pylast.PlayedTrack]
+
+    @classmethod
+    def from_played_tracks(
+        cls,
+        played_tracks: list[pylast.PlayedTrack],
+    ) -> "TrackIndex":
+        """Extract details of passed 'played tracks'.
+
+        Last.fm already returns all of them with the user's recent tracks, so this
+        doesn't make any (lazy) API requests and there's nothing to parallelize.
+
+        Arguments:
+            played_tracks: List of `pylast` 'played track' instances.
+
+        Returns:
+            Passed 'played tracks' details.
+        """
+        index = cls(
+            timestamps=[],
+            dates=[],
+            times=[],
+            track_names=[],
+            artists=[],
+            albums=[],
+            played_tracks=list(played_tracks),
+        )
+
+        for played_track in index.played_tracks:
+            timestamp = int(played_track.timestamp)
+            # Unlike caching the current local timezone offset, `time.localtime`
+            # also handles DST changes correctly, and doesn't create any `datetime`
+            # objects
+            played_at = time.localtime(timestamp)
+            # Formatting both at once is cheaper than formatting them separately
+            played_date, _, played_time = time.strftime(
+                DATETIME_FORMAT, played_at
+            ).partition(" ")
+
+            index.timestamps.append(timestamp)
+            index.dates.append(played_date)
+            index.times.append(played_time)
+            index.track_names.append(played_track.track.get_name())
+            index.artists.append(played_track.track.get_artist().get_name())
+            index.albums.append(played_track.album or "")
+
+        return index
+
+    def __len__(self) -> int:
+        """Return the number of tracks in the index."""
+        return len(self.timestamps)
+
+    def __getitem__(self, n: int) -> TrackRow:
+        """Return details of the `n`-th track in the index."""
+        return TrackRow(
+            artist=self.artists[n],
+            title=self.track_names[n],
+            album=self.albums[n],
+            ts=self.timestamps[n],
+            raw=self.played_tracks[n],
+        )
+
+    def find_played_at(self, timestamp: int) -> int:
+        """Find position of the first track played at (or after) passed timestamp.
+
+        Tracks are sorted by play time (oldest first), so it's a binary search.
+
+        Arguments:
+            timestamp: Unix timestamp to look for.
+
+        Returns:
+            Position of the first track played at (or after) passed timestamp, or
+            the number of tracks if all of them were played before it.
+        """
+        return bisect.bisect_left(self.timestamps, timestamp)
+
+
+class EnumeratedTrack(NamedTuple):
+    """Simple named tuple for an enumerated track.
 
     Attributes:
         n: Position of the track within the track list.
-        played_track: Played track details.
+        track: Played track details.
     """
 
     n: int
-    played_track: pylast.PlayedTrack
+    track: TrackRow
+
 
+def get_played_tracks(
+    lastfm_user: pylast.User,
+    time_from: int,
+    time_to: int,
+    *,
+    limit: int = 500,
+    windows: int = 4,
+) -> list[pylast.PlayedTrack]:
+    """Get Last.fm user 'played tracks' from passed time range, oldest first.
+
+    Last.fm API returns played tracks newest first, in pages that `pylast` fetches
+    one after another. To speed things up, the time range is split into smaller
+    windows, which are fetched concurrently. Windows with more than `limit` played
+    tracks are split further, so their oldest played tracks aren't left out.
 
-def get_played_track_title(played_track: pylast.PlayedTrack) -> list[tuple[str, str]]:
+    Arguments:
+        lastfm_user: Instance of `pylast` Last.fm user.
+        time_from: Time range start (as a Unix timestamp).
+        time_to: Time range end (as a Unix timestamp).
+        limit: Maximum number of played tracks to return.
+        windows: Number of windows to split the time range into.
+
+    Returns:
+        List of 'played track' instances, oldest first.
+    """
+    window_size = max(math.ceil((time_to - time_from) / windows), 1)
+    limit_reached = threading.Event()
+
+    def get_window_played_tracks(
+        window_from: int,
+        window_to: int,
+    ) -> list[pylast.PlayedTrack]:
+        """Get (up to `limit`) oldest 'played tracks' from a time window."""
+        if limit_reached.is_set():
+            return []
+
+        window_played_tracks = lastfm_user.get_recent_tracks(
+            limit=limit,
+            time_from=window_from,
+            time_to=window_to,
+        )
+        window_played_tracks.reverse()
+
+        # The newest played tracks are returned first, so if we hit the limit, the
+        # oldest ones might be missing
+        if len(window_played_tracks) < limit or window_to - window_from < 2:
+            return window_played_tracks
+
+        window_middle = (window_from + window_to) // 2
+        played_tracks = get_window_played_tracks(window_from, window_middle)
+        if len(played_tracks) < limit:
+            played_tracks = merge_played_tracks(
+                played_tracks,
+                get_window_played_tracks(window_middle, window_to),
+            )
+
+        return played_tracks[:limit]
+
+    def merge_played_tracks(
+        played_tracks: list[pylast.PlayedTrack],
+        newer_played_tracks: list[pylast.PlayedTrack],
+    ) -> list[pylast.PlayedTrack]:
+        """Merge 'played tracks' from two consecutive time windows."""
+        # Tracks played exactly on the window boundary can be returned twice
+        played_tracks_set = set(played_tracks)
+        return played_tracks + [
+            played_track
+            for played_track in newer_played_tracks
+            if played_track not in played_tracks_set
+        ]
+
+    played_tracks: list[pylast.PlayedTrack] = []
+    executor = ThreadPoolExecutor(max_workers=windows)
+    try:
+        futures = [
+            executor.submit(
+                get_window_played_tracks,
+                window_from,
+                min(window_from + window_size, time_to),
+            )
+            for window_from in range(time_from, time_to, window_size)
+        ]
+
+        for future in futures:
+            played_tracks = merge_played_tracks(played_tracks, future.result())
+
+            if len(played_tracks) >= limit:
+                limit_reached.set()
+                break
+    finally:
+        # Played tracks from newer windows won't be used, so don't wait for them
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return played_tracks[:limit]
+
+
+def get_played_track_title(index: TrackIndex, n: int) -> list[tuple[str, str]]:
     """Create a (`questionary` compatible) nicely formatted title for a 'played track'.
 
     Arguments:
-        played_track: Played track to generate a title for.
+        index: Played tracks details.
+        n: Position of the track to generate a title for.
 
     Returns:
         A `questionary` compatible title for passed 'played track'.
     """
-    played_at = datetime.fromtimestamp(int(played_track.timestamp), UTC)
-    played_at = played_at.astimezone()  # Local timezone
-    track_name = played_track.track.get_name()
-    artist = played_track.track.get_artist().get_name()
-    album = played_track.album
-
     title = [
-        ("class:date", played_at.strftime(DATE_FORMAT)),
+        ("class:date", index.dates[n]),
         ("", " "),
-        ("class:time", played_at.strftime(TIME_FORMAT)),
+        ("class:time", index.times[n]),
         ("", " | "),
-        ("class:track", track_name),
+        ("class:track", index.track_names[n]),
         ("", " by "),
-        ("class:artist", artist),
+        ("class:artist", index.artists[n]),
         ("", " from "),
-        ("class:album", album),
+        ("class:album", index.albums[n]),
     ]
 
     return title
 
 
+def get_page_choices(
+    track_choices: list[questionary.Choice],
+    *,
+    page: int,
+    page_size: int,
+    previous_choice: questionary.Choice,
+    next_choice: questionary.Choice,
+) -> list[questionary.Choice]:
+    """Get `questionary` choices for a single page of 'played tracks'.
+
+    Arguments:
+        track_choices: List of all 'played track' choices.
+        page: Page to get the choices for.
+        page_size: Page size.
+        previous_choice: Previous choice value.
+        next_choice: Next choice value.
+
+    Returns:
+        List of `questionary` choices.
+    """
+    page_choices = track_choices[page * page_size : (page + 1) * page_size]
+
+    # Show 'Previous' choice on all pages, except the first one
+    if page > 0:
+        page_choices = [previous_choice] + page_choices
+
+    # Show 'Next' choice only if there's a next page
+    if (page + 1) * page_size < len(track_choices):
+        page_choices = page_choices + [next_choice]
+
+    return page_choices
+
+
 def select_track(
-    tracks: list[pylast.PlayedTrack],
+    tracks: TrackIndex,
     *,
     page: int = 0,
     page_size: int = 10,
-    default_choice: dict[str, Any] | None = None,
+    default_choice: EnumeratedTrack | None = None,
     style: questionary.Style = MUSIC_SNAPSHOT_QUESTIONARY_STYLE,
     select_message: str = "Select song:",
     previous_choice: questionary.Choice | None = None,
@@ -85,7 +346,7 @@ def select_track(
     It uses `questionary.select` in the background, but pagination is done manually.
 
     Arguments:
-        tracks: List of 'played track' instances.
+        tracks: Played tracks details.
         page: Page to show.
         page_size: Page size.
         default_choice: Default choice to preselect.
@@ -103,41 +364,52 @@ def select_track(
     if not next_choice:
         next_choice = questionary.Choice("Next")
 
+    # Create all track choices once, instead of on every page change
+    track_choices = [
+        questionary.Choice(
+            title=get_played_track_title(tracks, n),
+            value=EnumeratedTrack(n=n, track=tracks[n]),
+        )
+        for n in range(len(tracks))
+    ]
+
+    # `questionary` compares `Choice` defaults directly, so it's easiest to pass
+    # the already created one
+    default = track_choices[default_choice.n] if default_choice else None
+
+    # Recently shown pages are reused, so going back and forth between them is
+    # instant. Dicts keep insertion order, so the least recently shown page is first.
+    pages_cache: dict[int, list[questionary.Choice]] = {}
+
     while True:
-        track_choices = []
-        for n, played_track in enumerate(
-            tracks[page * page_size : (page + 1) * page_size],
-            start=page * page_size,
-        ):
-            track_title = get_played_track_title(played_track)
-            track_choice = questionary.Choice(
-                title=track_title,
-                value=EnumeratedTrack(n=n, played_track=played_track),
+        page_choices = pages_cache.pop(page, None)
+        if page_choices is None:
+            page_choices = get_page_choices(
+                track_choices,
+                page=page,
+                page_size=page_size,
+                previous_choice=previous_choice,
+                next_choice=next_choice,
             )
-            track_choices.append(track_choice)
-
-        # Show 'Previous' choice on all pages, except the first one
-        if page > 0:
-            track_choices = [previous_choice] + track_choices
 
-        # Show 'Next' choice only if there's a next page
-        if (page + 1) * page_size < len(tracks):
-            track_choices = track_choices + [next_choice]
+        pages_cache[page] = page_choices
+        if len(pages_cache) > _PAGES_CACHE_SIZE:
+            del pages_cache[next(iter(pages_cache))]
 
         selected_track = questionary.select(
             select_message,
-            track_choices,
-            default=default_choice,
+            page_choices,
+            default=default,
             style=style,
         ).ask()
 
         if selected_track == previous_choice.value:
             page -= 1
-            default_choice = None
+            default = None
             continue
         elif selected_track == next_choice.value:
             page += 1
-            default_choice = None
+            default = None
             continue
         else:
             break
@@ -146,7 +418,7 @@ def select_track(
 
 
 def guess_end_track(
-    tracks: list[pylast.PlayedTrack],
+    tracks: TrackIndex,
     first_track_n: int,
     *,
     threshold: int = 60,
@@ -154,7 +426,7 @@ def guess_end_track(
     """Try to guess the end track of the 'music snapshot'.
 
     Arguments:
-        tracks: List of 'played track' instances.
+        tracks: Played tracks details.
         first_track_n: First 'music snapshot' track.
         threshold: Threshold (in minutes) to establish when the 'music snapshot'
             might've ended.
@@ -162,66 +434,129 @@ def guess_end_track(
     Returns:
         Guessed 'music snapshot' end track.
     """
-    guessed_track = None
-    for n, played_track in enumerate(tracks[first_track_n:], start=first_track_n):
-        track_played_at = datetime.fromtimestamp(int(played_track.timestamp), UTC)
-
-        # In case we traverse the whole list and don't find an end track,
-        # default to the last track
-        try:
-            next_track = tracks[n + 1]
-        except IndexError:
-            guessed_track = EnumeratedTrack(n=n, played_track=played_track)
-            break
+    if first_track_n >= len(tracks):
+        return None
+
+    # Timestamps are already plain integers, so there's no need to convert them
+    # to `datetime` objects just to compare them
+    threshold_seconds = threshold * 60
+    timestamps = tracks.timestamps
+    previous_ts = timestamps[first_track_n]
 
-        next_track_played_at = datetime.fromtimestamp(int(next_track.timestamp), UTC)
+    for n in range(first_track_n + 1, len(timestamps)):
+        ts = timestamps[n]
 
         # If the difference between two tracks is more then the threshold, the earlier
         # one could be the end track. We could also involve track duration into the
         # math, but this is easier for now.
-        if (next_track_played_at - track_played_at) > timedelta(minutes=threshold):
-            guessed_track = EnumeratedTrack(n=n, played_track=played_track)
-            break
+        if ts - previous_ts > threshold_seconds:
+            return EnumeratedTrack(n=n - 1, track=tracks[n - 1])
+
+        previous_ts = ts
+
+    # In case we traverse the whole list and don't find an end track,
+    # default to the last track
+    return EnumeratedTrack(n=len(tracks) - 1, track=tracks[-1])
+
+
+def normalize_track(artist_name: str, track_name: str) -> tuple[str, str]:
+    """Clean up Last.fm artist and track names, so they're ready for Spotify search.
 
-    return guessed_track
+    Arguments:
+        artist_name: Last.fm artist name.
+        track_name: Last.fm track name.
 
+    Returns:
+        Cleaned up artist and track names.
+    """
+    artist_name = _ARTIST_NAME_THE_RE.sub("", artist_name)
+    track_name = _TRACK_NAME_FEATURING_RE.sub("", track_name)
 
-def lastfm_track_to_spotify(
+    artist_name = artist_name.strip()
+    track_name = track_name.strip()
+
+    return artist_name, track_name
+
+
+def lastfm_tracks_to_spotify(
     spotify_api: spotipy.Spotify,
-    track: pylast.Track,
-) -> dict:
-    """Match passed Last.fm 'played track' to a Spotify song.
+    tracks: Iterable[TrackRow],
+    *,
+    track_cache: TrackCache | None = None,
+    max_workers: int = 16,
+) -> Iterator[str | None]:
+    """Match passed Last.fm 'played tracks' to Spotify song IDs.
+
+    Searching for songs is network bound, so it's done concurrently. Matched song
+    IDs are yielded (in the same order as passed tracks) as soon as they're ready.
 
     Arguments:
         spotify_api: Instance of `spotipy` Spotify API client.
-        track: Instance of `pylast` track.
-
-    Raises:
-        ValueError: When the passed track couldn't be match to a Spotify song.
+        tracks: Played tracks details.
+        track_cache: Instance of `TrackCache`, consulted before searching Spotify.
+        max_workers: Maximum number of concurrent Spotify searches.
 
     Returns:
-        A `TrackObject` dictionary from Spotify Web API.
+        Iterator of matched Spotify song IDs (or `None`, if the song wasn't found).
     """
-    artist_name: str = track.get_artist().get_name()
 
-    track_name: str = track.get_name()
-    # Last.fm and Spotify naming conventions sometimes differ, so it's safer
-    # to remove some of the extra words and 'suffixes'
-    for word in ["the", "The"]:
-        artist_name = artist_name.replace(word, "")
+    def get_spotify_song_id(artist_name: str, track_name: str) -> str | None:
+        """Match passed (normalized) artist and track names to a Spotify song ID."""
+        cache_key = TrackCache.make_key(artist_name, track_name)
 
-    for suffix in ["ft", "Ft", "(ft", "(Ft", "feat", "Feat", "(feat", "(Feat"]:
-        track_name = track_name.removesuffix(suffix)
+        if track_cache:
+            try:
+                return track_cache.get(cache_key)
+            except KeyError:
+                pass
 
-    artist_name = artist_name.strip()
-    track_name = track_name.strip()
+        song_id = search_spotify_song(
+            spotify_api=spotify_api,
+            artist_name=artist_name,
+            track_name=track_name,
+        )
+
+        if track_cache:
+            track_cache.set(cache_key, song_id)
+
+        return song_id
 
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # The same song is often played multiple times within a single 'music
+        # snapshot', so it's matched only once and all its plays share the result
+        searches: dict[tuple[str, str], Future[str | None]] = {}
+        futures = []
+        for track in tracks:
+            song = normalize_track(track.artist, track.title)
+            if song not in searches:
+                searches[song] = executor.submit(get_spotify_song_id, *song)
+            futures.append(searches[song])
+
+        for future in futures:
+            yield future.result()
+
+
+def search_spotify_song(
+    spotify_api: spotipy.Spotify,
+    artist_name: str,
+    track_name: str,
+) -> str | None:
+    """Search for a Spotify song by its artist and name.
+
+    Arguments:
+        spotify_api: Instance of `spotipy` Spotify API client.
+        artist_name: Artist name.
+        track_name: Track name.
+
+    Returns:
+        Spotify song ID, if the song was found.
+    """
     # Using `album:` for some reason doesn't work with some singles
     q = f"artist:{artist_name} track:{track_name}"
     spotify_search_results = spotify_api.search(q=q, limit=1, type="track")
-    results = spotify_search_results["tracks"]["items"]
+    results = _get_search_items(_get_search_tracks(spotify_search_results))
 
     if len(results) == 0:
-        raise ValueError(f"Couldn't find '{track_name} by {artist_name}' in Spotify.")
+        return None
 
-    return results[0]
+    return results[0]["id"]
@@ -1,7 +1,10 @@
 """music_snapshot utils."""
 
-from collections.abc import Generator, Sequence
+import itertools
+import re
+from collections.abc import Iterable, Iterator
 from datetime import date, time
+from typing import TypeVar
 
 from click_default_group import DefaultGroup
 from rich_click import RichGroup
@@ -15,23 +18,39 @@ TIME_FORMAT = "%H:%M"
 DATETIME_FORMAT = f"{DATE_FORMAT} {TIME_FORMAT}"
 """Default `music_snapshot` datetime format."""
 
+T = TypeVar("T")
+
+# Cheap format prechecks, so (the much more common while typing) invalid values
+# don't need to go through raising and catching an exception
+_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+_TIME_RE = re.compile(r"\d{2}:\d{2}(?::\d{2})?")
+
 
 class DefaultRichGroup(DefaultGroup, RichGroup):
     """Make `click-default-group` work with `rick-click`."""
 
 
-def chunks(seq: Sequence, n: int) -> Generator[Sequence]:
-    """Yield successive `n` sized chunks from `seq`.
+def chunks(iterable: Iterable[T], n: int) -> Iterator[list[T]]:
+    """Yield successive `n` sized chunks from `iterable`.
+
+    The iterable is consumed lazily, so it works with generators as well, and each
+    chunk is yielded as soon as it's complete.
 
     Arguments:
-        seq: Sequence to chunk.
+        iterable: Iterable to chunk.
         n: Chunk size.
 
+    Raises:
+        ValueError: When passed chunk size is smaller than 1.
+
     Returns:
-        Generator that yields `n` sized chunks from passed `seq`.
+        Iterator that yields `n` sized chunks from passed `iterable`.
     """
-    for i in range(0, len(seq), n):
-        yield seq[i : i + n]
+    if n < 1:
+        raise ValueError(f"Chunk size must be at least 1, got {n}.")
+
+    iterator = iter(iterable)
+    return iter(lambda: list(itertools.islice(iterator, n)), [])
 
 
 def validate_date(value: str) -> bool:
@@ -43,6 +62,9 @@ def validate_date(value: str) -> bool:
     Returns:
         Whether passed value is in ISO date format.
     """
+    if not _DATE_RE.fullmatch(value):
+        return False
+
     try:
         date.fromisoformat(value)
     except ValueError:
@@ -60,6 +82,9 @@ def validate_time(value: str) -> bool:
     Returns:
         Whether passed value is in ISO time format.
     """
+    if not _TIME_RE.fullmatch(value):
+        return False
+
     try:
         time.fromisoformat(value)
     except ValueError:
@@ -1,5 +1,6 @@
 """music_snapshot pytest configuration and utils."""
 
+import pylast
 import pytest
 from click.testing import CliRunner
 
@@ -8,3 +9,12 @@ from click.testing import CliRunner
 def cli_runner() -> CliRunner:
     """Return a `CliRunner` instance."""
     return CliRunner()
+
+
+@pytest.fixture(scope="session")
+def lastfm_api() -> pylast.LastFMNetwork:
+    """Return a `pylast` Last.fm API client instance."""
+    return pylast.LastFMNetwork(
+        api_key="api_key",
+        api_secret="api_secret",  # noqa: S106
+    )
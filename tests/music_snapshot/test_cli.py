@@ -1,9 +1,20 @@
 """Test `music_snapshot.cli` module."""
 
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+from unittest.mock import MagicMock, patch
+
+import pylast
+import pytest
+import questionary
 from click.testing import CliRunner
 
 from music_snapshot import __version__
-from music_snapshot.cli import cli
+from music_snapshot import cli as cli_module
+from music_snapshot.cli import MusicSnapshotContext, cli, open_track_cache
+from music_snapshot.config import MusicSnapshotConfig
+from music_snapshot.track_cache import TrackCache
 
 
 def test_cli_version(cli_runner: CliRunner) -> None:
@@ -12,3 +23,138 @@ def test_cli_version(cli_runner: CliRunner) -> None:
 
     assert result.exit_code == 0
     assert __version__ in result.output
+
+
+@pytest.mark.parametrize("corrupted_cache", [False, True])
+def test_cli_create(
+    cli_runner: CliRunner,
+    lastfm_api: pylast.LastFMNetwork,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    corrupted_cache: bool,
+) -> None:
+    """Creates a playlist with found songs, added in order and in chunks."""
+    config_path = tmp_path / "config"
+    MusicSnapshotConfig(lastfm_username="lastfm_username").save_to_disk(config_path)
+    monkeypatch.setattr(cli_module, "MUSIC_SNAPSHOT_CONFIG_PATH", config_path)
+
+    cache_path = tmp_path / "spotify_search.sqlite"
+    if corrupted_cache:
+        cache_path.write_bytes(b"This is not an SQLite database." * 100)
+    monkeypatch.setattr(cli_module, "TRACK_CACHE_PATH", cache_path)
+
+    # 250 tracks, played one after another, starting at snapshot start time
+    start_timestamp = int(datetime(2024, 1, 15, 10).timestamp())
+    timestamps = [start_timestamp + n * 60 for n in range(250)]
+    played_tracks = [
+        pylast.PlayedTrack(
+            track=pylast.Track("Artist", f"Title {n}", lastfm_api),
+            album="Album",
+            playback_date="",
+            timestamp=str(timestamp),
+        )
+        for n, timestamp in enumerate(timestamps)
+    ]
+
+    def get_recent_tracks(limit: int, time_from: int, time_to: int) -> list:
+        """Return played tracks from passed time range, newest first."""
+        return [
+            played_track
+            for played_track, timestamp in zip(
+                reversed(played_tracks), reversed(timestamps), strict=True
+            )
+            if time_from <= timestamp <= time_to
+        ][:limit]
+
+    lastfm_api_mock = MagicMock()
+    get_user = lastfm_api_mock.get_user
+    get_user.return_value.get_recent_tracks.side_effect = get_recent_tracks
+
+    not_found = {"Title 7", "Title 150"}
+
+    def search(q: str, limit: int, type: str) -> dict:  # noqa: A002
+        """Return a Spotify song with ID based on its name, if it's 'found'."""
+        track_name = q.split("track:")[1]
+        items = [] if track_name in not_found else [{"id": track_name}]
+        return {"tracks": {"items": items}}
+
+    spotify_api = MagicMock()
+    spotify_api.me.return_value = {"id": "spotify_user_id"}
+    spotify_api.user_playlist_create.return_value = {"id": "playlist_id"}
+    spotify_api.search.side_effect = search
+
+    def select(message: str, choices: list, **kwargs: Any) -> MagicMock:
+        """Answer `questionary.select` prompts."""
+        if message == "Select first song:":
+            answer = choices[0].value
+        elif message == "Select last song:":
+            # The guessed last track, which is preselected
+            answer = kwargs["default"]
+            if isinstance(answer, questionary.Choice):
+                answer = answer.value
+        else:
+            answer = {
+                "Select snapshot start date:": "2024-01-15",
+                "Select snapshot (estimated) start time:": "10:00",
+            }[message]
+
+        prompt = MagicMock()
+        prompt.ask.return_value = answer
+        return prompt
+
+    with (
+        patch.object(MusicSnapshotContext, "lastfm_api", lastfm_api_mock),
+        patch.object(MusicSnapshotContext, "spotify_api", spotify_api),
+        patch("questionary.select", side_effect=select),
+        patch("questionary.text") as text,
+        patch("questionary.confirm") as confirm,
+    ):
+        text.return_value.ask.return_value = "Snapshot"
+        confirm.return_value.ask.return_value = True
+
+        result = cli_runner.invoke(cli, args=["create"])
+
+    assert result.exit_code == 0, result.output
+    assert ("Couldn't open Spotify search cache" in result.output) is corrupted_cache
+    assert "Couldn't find 'Title 7 by Artist' in Spotify." in result.output
+    assert "Couldn't find 'Title 150 by Artist' in Spotify." in result.output
+    assert "Successfully added 248 songs to 'Snapshot'." in result.output
+
+    spotify_api.user_playlist_create.assert_called_once()
+    added_song_chunks = [
+        call.kwargs["items"] for call in spotify_api.playlist_add_items.call_args_list
+    ]
+    assert [len(song_chunk) for song_chunk in added_song_chunks] == [100, 100, 48]
+    assert sum(added_song_chunks, []) == [
+        f"Title {n}" for n in range(250) if f"Title {n}" not in not_found
+    ]
+
+
+def test_open_track_cache(tmp_path: Path) -> None:
+    """Opens Spotify search cache and saves it on exit."""
+    cache_path = tmp_path / "spotify_search.sqlite"
+
+    with open_track_cache(cache_path) as track_cache:
+        assert track_cache is not None
+        track_cache.set("key", "spotify_id")
+
+    with TrackCache(cache_path) as track_cache:
+        assert track_cache.get("key") == "spotify_id"
+
+
+def test_open_track_cache_corrupted_file(tmp_path: Path) -> None:
+    """Continues without Spotify search cache when the cache file is corrupted."""
+    cache_path = tmp_path / "spotify_search.sqlite"
+    cache_path.write_bytes(b"This is not an SQLite database." * 100)
+
+    with open_track_cache(cache_path) as track_cache:
+        assert track_cache is None
+
+
+def test_open_track_cache_not_writable_directory(tmp_path: Path) -> None:
+    """Continues without Spotify search cache when it can't be created."""
+    (tmp_path / "file").touch()
+    cache_path = tmp_path / "file" / "spotify_search.sqlite"
+
+    with open_track_cache(cache_path) as track_cache:
+        assert track_cache is None
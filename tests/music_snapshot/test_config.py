@@ -0,0 +1,47 @@
+"""Test `music_snapshot.config` module."""
+
+import os
+from pathlib import Path
+
+import pytest
+
+from music_snapshot import config as config_module
+from music_snapshot.config import MusicSnapshotConfig
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_config_save_and_load(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    use_orjson: bool,
+) -> None:
+    """Loads config saved to disk (with and without `orjson`)."""
+    if use_orjson:
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(config_module, "orjson", None)
+
+    config_path = tmp_path / "config"
+    config = MusicSnapshotConfig(
+        spotify_client_id="spotify_client_id",
+        lastfm_username="lastfm_username",
+    )
+
+    config.save_to_disk(config_path)
+
+    assert MusicSnapshotConfig.load_from_disk(config_path) == config
+    assert MusicSnapshotConfig.load_from_disk(str(config_path)) == config
+    assert (config_path.stat().st_mode & 0o777) == 0o600
+
+
+def test_config_load_reloads_changed_file(tmp_path: Path) -> None:
+    """Loads config again when the config file changes."""
+    config_path = tmp_path / "config"
+    MusicSnapshotConfig(lastfm_username="old").save_to_disk(config_path)
+    assert MusicSnapshotConfig.load_from_disk(config_path).lastfm_username == "old"
+
+    MusicSnapshotConfig(lastfm_username="new").save_to_disk(config_path)
+    mtime_ns = config_path.stat().st_mtime_ns + 1_000_000_000
+    os.utime(config_path, ns=(mtime_ns, mtime_ns))
+
+    assert MusicSnapshotConfig.load_from_disk(config_path).lastfm_username == "new"
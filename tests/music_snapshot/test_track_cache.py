@@ -0,0 +1,55 @@
+"""Test `music_snapshot.track_cache` module."""
+
+from pathlib import Path
+
+import pytest
+
+from music_snapshot.track_cache import TrackCache
+
+
+def test_track_cache_make_key() -> None:
+    """Creates a case insensitive key."""
+    assert TrackCache.make_key("Artist", "Title") == TrackCache.make_key(
+        "ARTIST", "title"
+    )
+    assert TrackCache.make_key("Artist", "Title") != TrackCache.make_key(
+        "ArtistT", "itle"
+    )
+
+
+def test_track_cache_get_missing(tmp_path: Path) -> None:
+    """Raises `KeyError` for keys that are not cached."""
+    with TrackCache(tmp_path / "cache") as track_cache, pytest.raises(KeyError):
+        track_cache.get("key")
+
+
+def test_track_cache_persisted(tmp_path: Path) -> None:
+    """Persists cached values on disk."""
+    with TrackCache(tmp_path / "cache") as track_cache:
+        track_cache.set("key", "spotify_id")
+        track_cache.set("not_found_key", None)
+
+        assert track_cache.get("key") == "spotify_id"
+
+    with TrackCache(tmp_path / "cache") as track_cache:
+        assert track_cache.get("key") == "spotify_id"
+        assert track_cache.get("not_found_key") is None
+
+
+def test_track_cache_creates_parent_directories(tmp_path: Path) -> None:
+    """Creates missing cache file parent directories."""
+    with TrackCache(tmp_path / "music_snapshot" / "cache") as track_cache:
+        track_cache.set("key", "spotify_id")
+
+    assert (tmp_path / "music_snapshot" / "cache").exists()
+
+
+def test_track_cache_not_found_ttl(tmp_path: Path) -> None:
+    """Expires cached 'not found' values after `not_found_ttl` seconds."""
+    with TrackCache(tmp_path / "cache", not_found_ttl=-1) as track_cache:
+        track_cache.set("key", "spotify_id")
+        track_cache.set("not_found_key", None)
+
+        assert track_cache.get("key") == "spotify_id"
+        with pytest.raises(KeyError):
+            track_cache.get("not_found_key")
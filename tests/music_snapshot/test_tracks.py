@@ -0,0 +1,437 @@
+"""Test `music_snapshot.tracks` module."""
+
+import threading
+import time
+from collections.abc import Generator
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pylast
+import pytest
+
+from music_snapshot.track_cache import TrackCache
+from music_snapshot.tracks import (
+    EnumeratedTrack,
+    TrackIndex,
+    TrackRow,
+    get_played_track_title,
+    get_played_tracks,
+    guess_end_track,
+    lastfm_tracks_to_spotify,
+    normalize_track,
+    select_track,
+)
+
+
+@pytest.fixture()
+def spotify_api() -> MagicMock:
+    """Return a mocked `spotipy` Spotify API client."""
+    spotify_api = MagicMock()
+    spotify_api.search.return_value = {"tracks": {"items": [{"id": "spotify_id"}]}}
+    return spotify_api
+
+
+def make_track_index(
+    lastfm_api: pylast.LastFMNetwork,
+    timestamps: list[int],
+) -> TrackIndex:
+    """Create 'played tracks' details played at passed timestamps."""
+    return TrackIndex.from_played_tracks(
+        [
+            pylast.PlayedTrack(
+                track=pylast.Track("Artist", f"Title {n}", lastfm_api),
+                album="Album",
+                playback_date="",
+                timestamp=str(timestamp),
+            )
+            for n, timestamp in enumerate(timestamps)
+        ]
+    )
+
+
+def make_lastfm_user(played_tracks: list[pylast.PlayedTrack]) -> MagicMock:
+    """Create a mocked Last.fm user that has played passed tracks."""
+    timestamps = []
+    for played_track in played_tracks:
+        assert played_track.timestamp is not None
+        timestamps.append(int(played_track.timestamp))
+
+    def get_recent_tracks(limit: int, time_from: int, time_to: int) -> list:
+        """Return played tracks from passed time range, newest first."""
+        return [
+            played_track
+            for played_track, timestamp in zip(
+                reversed(played_tracks), reversed(timestamps), strict=True
+            )
+            if time_from <= timestamp <= time_to
+        ][:limit]
+
+    lastfm_user = MagicMock()
+    lastfm_user.get_recent_tracks.side_effect = get_recent_tracks
+
+    return lastfm_user
+
+
+def test_get_played_tracks(lastfm_api: pylast.LastFMNetwork) -> None:
+    """Returns played tracks from the whole time range, oldest first."""
+    played_tracks = [
+        pylast.PlayedTrack(
+            track=pylast.Track("Artist", f"Title {timestamp}", lastfm_api),
+            album="Album",
+            playback_date="",
+            timestamp=str(timestamp),
+        )
+        for timestamp in [100, 150, 200, 250, 399, 400]
+    ]
+    lastfm_user = make_lastfm_user(played_tracks)
+
+    assert get_played_tracks(lastfm_user, 100, 400) == played_tracks
+    assert get_played_tracks(lastfm_user, 100, 400, limit=3) == played_tracks[:3]
+
+
+def test_get_played_tracks_window_over_limit(lastfm_api: pylast.LastFMNetwork) -> None:
+    """Returns the oldest played tracks, even if a single window has more of them."""
+    played_tracks = [
+        pylast.PlayedTrack(
+            track=pylast.Track("Artist", f"Title {timestamp}", lastfm_api),
+            album="Album",
+            playback_date="",
+            timestamp=str(timestamp),
+        )
+        for timestamp in [100, 101, 102, 103, 104, 105, 300]
+    ]
+    lastfm_user = make_lastfm_user(played_tracks)
+
+    assert get_played_tracks(lastfm_user, 100, 400, limit=3) == played_tracks[:3]
+    assert get_played_tracks(lastfm_user, 100, 400, limit=6) == played_tracks[:6]
+    assert get_played_tracks(lastfm_user, 100, 400, windows=1) == played_tracks
+
+
+def test_get_played_tracks_limit_reached(lastfm_api: pylast.LastFMNetwork) -> None:
+    """Doesn't wait for newer time windows once the limit is reached."""
+    played_tracks = [
+        pylast.PlayedTrack(
+            track=pylast.Track("Artist", f"Title {timestamp}", lastfm_api),
+            album="Album",
+            playback_date="",
+            timestamp=str(timestamp),
+        )
+        for timestamp in [100, 101, 102, 103, 104, 105]
+    ]
+    lastfm_user = make_lastfm_user(played_tracks)
+    get_recent_tracks = lastfm_user.get_recent_tracks.side_effect
+
+    release = threading.Event()
+    finished_windows = []
+
+    def get_recent_tracks_slowly(limit: int, time_from: int, time_to: int) -> list:
+        """Block requests for windows other than the first one."""
+        if time_from >= 175:
+            release.wait(timeout=5)
+            finished_windows.append(time_from)
+
+        return get_recent_tracks(limit, time_from, time_to)
+
+    lastfm_user.get_recent_tracks.side_effect = get_recent_tracks_slowly
+
+    try:
+        assert get_played_tracks(lastfm_user, 100, 400, limit=3) == played_tracks[:3]
+        assert finished_windows == []
+    finally:
+        release.set()
+
+
+@pytest.fixture()
+def warsaw_timezone(monkeypatch: pytest.MonkeyPatch) -> Generator[None]:
+    """Set local timezone to 'Europe/Warsaw'."""
+    monkeypatch.setenv("TZ", "Europe/Warsaw")
+    time.tzset()
+
+    yield
+
+    monkeypatch.undo()
+    time.tzset()
+
+
+@pytest.mark.usefixtures("warsaw_timezone")
+def test_track_index_from_played_tracks(lastfm_api: pylast.LastFMNetwork) -> None:
+    """Extracts 'played tracks' details, without making any API requests."""
+    played_tracks = [
+        pylast.PlayedTrack(
+            track=pylast.Track("Artist", "Title", lastfm_api),
+            album=None,
+            playback_date="",
+            timestamp="1700000000",
+        ),
+        pylast.PlayedTrack(
+            track=pylast.Track("Other Artist", "Other Title", lastfm_api),
+            album="Album",
+            playback_date="",
+            timestamp="1700000300",
+        ),
+    ]
+
+    with patch.object(pylast._Request, "execute") as execute_mock:
+        index = TrackIndex.from_played_tracks(played_tracks)
+
+    execute_mock.assert_not_called()
+
+    assert len(index) == 2
+    assert index.timestamps == [1700000000, 1700000300]
+    assert index.dates == ["2023-11-14", "2023-11-14"]
+    assert index.times == ["23:13", "23:18"]
+    assert index.track_names == ["Title", "Other Title"]
+    assert index.artists == ["Artist", "Other Artist"]
+    assert index.albums == ["", "Album"]
+    assert index[1] == TrackRow(
+        artist="Other Artist",
+        title="Other Title",
+        album="Album",
+        ts=1700000300,
+        raw=played_tracks[1],
+    )
+
+
+@pytest.mark.parametrize(
+    ("timestamp", "expected"),
+    [
+        (50, 0),
+        (100, 0),
+        (101, 1),
+        (200, 1),
+        (250, 3),
+        (301, 4),
+    ],
+)
+def test_track_index_find_played_at(
+    lastfm_api: pylast.LastFMNetwork,
+    timestamp: int,
+    expected: int,
+) -> None:
+    """Finds position of the first track played at (or after) passed timestamp."""
+    tracks = make_track_index(lastfm_api, [100, 200, 200, 300])
+
+    assert tracks.find_played_at(timestamp) == expected
+
+
+@pytest.mark.usefixtures("warsaw_timezone")
+def test_get_played_track_title(lastfm_api: pylast.LastFMNetwork) -> None:
+    """Formats track title, with play time in local timezone (including DST)."""
+    # 2024-01-15 12:00 UTC and 2024-07-15 12:00 UTC
+    tracks = make_track_index(lastfm_api, [1705320000, 1721044800])
+
+    assert get_played_track_title(tracks, 0) == [
+        ("class:date", "2024-01-15"),
+        ("", " "),
+        ("class:time", "13:00"),
+        ("", " | "),
+        ("class:track", "Title 0"),
+        ("", " by "),
+        ("class:artist", "Artist"),
+        ("", " from "),
+        ("class:album", "Album"),
+    ]
+    assert get_played_track_title(tracks, 1)[2] == ("class:time", "14:00")
+
+
+def test_guess_end_track(lastfm_api: pylast.LastFMNetwork) -> None:
+    """Guesses the last track played before a long enough break."""
+    tracks = make_track_index(lastfm_api, [0, 180, 360, 360 + 3601, 4200, 8000])
+
+    assert guess_end_track(tracks, first_track_n=0) == EnumeratedTrack(
+        n=2, track=tracks[2]
+    )
+    assert guess_end_track(tracks, first_track_n=3) == EnumeratedTrack(
+        n=4, track=tracks[4]
+    )
+
+
+def test_guess_end_track_defaults_to_last_track(
+    lastfm_api: pylast.LastFMNetwork,
+) -> None:
+    """Defaults to the last track when there was no long enough break."""
+    tracks = make_track_index(lastfm_api, [0, 180, 360, 540])
+
+    assert guess_end_track(tracks, first_track_n=1) == EnumeratedTrack(
+        n=3, track=tracks[3]
+    )
+
+
+@pytest.mark.parametrize(
+    ("track_name", "expected"),
+    [
+        ("Title", "Title"),
+        ("Title ft", "Title"),
+        ("Title (feat. Other Artist)", "Title"),
+        ("Title [Ft. Other Artist]", "Title"),
+        ("Title feat. Other Artist", "Title"),
+        ("Title FEAT Other Artist", "Title"),
+        ("Loft", "Loft"),
+        ("Feat of Strength", "Feat of Strength"),
+        ("Defeated", "Defeated"),
+    ],
+)
+def test_normalize_track_name(track_name: str, expected: str) -> None:
+    """Removes 'featuring' suffixes from track names."""
+    assert normalize_track("Artist", track_name) == ("Artist", expected)
+
+
+def test_select_track(lastfm_api: pylast.LastFMNetwork) -> None:
+    """Paginates tracks and returns the selected one."""
+    tracks = make_track_index(lastfm_api, list(range(0, 2500, 100)))
+
+    with patch("questionary.select") as select:
+        select.return_value.ask.side_effect = [
+            "Next",
+            "Next",
+            "Previous",
+            EnumeratedTrack(n=12, track=tracks[12]),
+        ]
+        selected_track = select_track(tracks, page_size=10)
+
+    assert selected_track == EnumeratedTrack(n=12, track=tracks[12])
+
+    pages = [call.args[1] for call in select.call_args_list]
+    assert [len(choices) for choices in pages] == [11, 12, 6, 12]
+    assert [choice.value for choice in pages[0][:-1]] == [
+        EnumeratedTrack(n=n, track=tracks[n]) for n in range(10)
+    ]
+    # Revisited pages are reused
+    assert pages[1] is pages[3]
+
+
+def test_select_track_pages_cache_size(lastfm_api: pylast.LastFMNetwork) -> None:
+    """Only reuses recently shown pages."""
+    tracks = make_track_index(lastfm_api, list(range(0, 2500, 100)))
+
+    with patch("questionary.select") as select:
+        select.return_value.ask.side_effect = [
+            *["Next"] * 9,
+            *["Previous"] * 9,
+            EnumeratedTrack(n=0, track=tracks[0]),
+        ]
+        select_track(tracks, page_size=1)
+
+    pages = [call.args[1] for call in select.call_args_list]
+    # Going back to pages 9 - 2 reuses them, but page 1 and 0 are built again
+    assert all(pages[n] is pages[18 - n] for n in range(2, 10))
+    assert pages[1] is not pages[17]
+    assert pages[0] is not pages[18]
+    assert [choice.value for choice in pages[0]] == [
+        choice.value for choice in pages[18]
+    ]
+
+
+def test_select_track_default_choice(lastfm_api: pylast.LastFMNetwork) -> None:
+    """Preselects the default choice, but only on the initial page."""
+    tracks = make_track_index(lastfm_api, list(range(0, 2500, 100)))
+    default_choice = EnumeratedTrack(n=12, track=tracks[12])
+
+    with patch("questionary.select") as select:
+        select.return_value.ask.side_effect = ["Next", default_choice]
+        select_track(tracks, page=1, page_size=10, default_choice=default_choice)
+
+    first_call, second_call = select.call_args_list
+    assert first_call.kwargs["default"].value == default_choice
+    assert first_call.kwargs["default"] in first_call.args[1]
+    assert second_call.kwargs["default"] is None
+
+
+@pytest.mark.parametrize(
+    ("artist_name", "expected"),
+    [
+        ("Artist", "Artist"),
+        ("The Artist", "Artist"),
+        ("the artist", "artist"),
+        ("Artist and the Band", "Artist and Band"),
+        ("Heather", "Heather"),
+        ("Theory", "Theory"),
+    ],
+)
+def test_normalize_track_artist_name(artist_name: str, expected: str) -> None:
+    """Removes 'the' from artist names."""
+    assert normalize_track(artist_name, "Title") == (expected, "Title")
+
+
+def test_lastfm_tracks_to_spotify_searches_once(
+    spotify_api: MagicMock,
+    lastfm_api: pylast.LastFMNetwork,
+) -> None:
+    """Searches Spotify only once for the same track."""
+    track = make_track_index(lastfm_api, [0])[0]
+
+    spotify_song_ids = lastfm_tracks_to_spotify(spotify_api, [track, track, track])
+
+    assert list(spotify_song_ids) == ["spotify_id"] * 3
+    spotify_api.search.assert_called_once_with(
+        q="artist:Artist track:Title 0",
+        limit=1,
+        type="track",
+    )
+
+
+def test_lastfm_tracks_to_spotify_searches_once_normalized(
+    spotify_api: MagicMock,
+    lastfm_api: pylast.LastFMNetwork,
+) -> None:
+    """Searches Spotify only once for tracks with the same normalized names."""
+    tracks = TrackIndex.from_played_tracks(
+        [
+            pylast.PlayedTrack(
+                track=pylast.Track(artist_name, track_name, lastfm_api),
+                album="Album",
+                playback_date="",
+                timestamp=str(timestamp),
+            )
+            for timestamp, (artist_name, track_name) in enumerate(
+                [
+                    ("The Artist", "Title"),
+                    ("Artist", "Title (feat. Other Artist)"),
+                    ("Artist", "Title"),
+                ]
+            )
+        ]
+    )
+
+    spotify_song_ids = lastfm_tracks_to_spotify(
+        spotify_api, [tracks[n] for n in range(len(tracks))]
+    )
+
+    assert list(spotify_song_ids) == ["spotify_id"] * 3
+    spotify_api.search.assert_called_once_with(
+        q="artist:Artist track:Title",
+        limit=1,
+        type="track",
+    )
+
+
+def test_lastfm_tracks_to_spotify(
+    spotify_api: MagicMock,
+    lastfm_api: pylast.LastFMNetwork,
+    tmp_path: Path,
+) -> None:
+    """Returns Spotify song IDs in order, consulting passed track cache first."""
+    tracks = make_track_index(lastfm_api, [0, 100, 200])
+
+    def search(q: str, limit: int, type: str) -> dict:  # noqa: A002
+        """Find all songs, except 'Title 1'."""
+        if q.endswith("Title 1"):
+            return {"tracks": {"items": []}}
+
+        return {"tracks": {"items": [{"id": q.removeprefix("artist:Artist track:")}]}}
+
+    spotify_api.search.side_effect = search
+
+    with TrackCache(tmp_path / "cache") as track_cache:
+        track_cache.set(TrackCache.make_key("Artist", "Title 2"), "cached_id")
+
+        spotify_song_ids = lastfm_tracks_to_spotify(
+            spotify_api,
+            [tracks[n] for n in range(len(tracks))],
+            track_cache=track_cache,
+        )
+
+        assert list(spotify_song_ids) == ["Title 0", None, "cached_id"]
+        assert spotify_api.search.call_count == 2
+        assert track_cache.get(TrackCache.make_key("Artist", "Title 0")) == "Title 0"
+        assert track_cache.get(TrackCache.make_key("Artist", "Title 1")) is None
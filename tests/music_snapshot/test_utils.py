@@ -0,0 +1,65 @@
+"""Test `music_snapshot.utils` module."""
+
+import pytest
+
+from music_snapshot.utils import chunks, validate_date, validate_time
+
+
+@pytest.mark.parametrize(
+    ("n", "expected"),
+    [
+        (2, [[0, 1], [2, 3], [4]]),
+        (5, [[0, 1, 2, 3, 4]]),
+        (10, [[0, 1, 2, 3, 4]]),
+    ],
+)
+def test_chunks(n: int, expected: list[list[int]]) -> None:
+    """Yields successive `n` sized chunks."""
+    assert list(chunks(range(5), n=n)) == expected
+    assert list(chunks(iter(range(5)), n=n)) == expected
+
+
+def test_chunks_empty() -> None:
+    """Yields nothing for an empty iterable."""
+    assert list(chunks([], n=2)) == []
+
+
+@pytest.mark.parametrize("n", [0, -1])
+def test_chunks_invalid_size(n: int) -> None:
+    """Raises `ValueError` for chunk sizes smaller than 1."""
+    with pytest.raises(ValueError, match="Chunk size must be at least 1"):
+        chunks(range(5), n=n)
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    [
+        ("2024-01-31", True),
+        ("2024-02-30", False),
+        ("2024-1-31", False),
+        ("20240131", False),
+        ("2024-01-31 ", False),
+        ("2024-01", False),
+        ("", False),
+    ],
+)
+def test_validate_date(value: str, expected: bool) -> None:
+    """Checks if passed value is in ISO date format."""
+    assert validate_date(value) is expected
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    [
+        ("21:37", True),
+        ("21:37:15", True),
+        ("24:00", False),
+        ("9:15", False),
+        ("2137", False),
+        ("21:37:", False),
+        ("", False),
+    ],
+)
+def test_validate_time(value: str, expected: bool) -> None:
+    """Checks if passed value is in ISO time format."""
+    assert validate_time(value) is expected